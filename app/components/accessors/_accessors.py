@@ -1,6 +1,5 @@
 import abc
 import asyncio
-from threading import Lock
 
 from ..network_sources import Backend
 
@@ -43,27 +42,28 @@ class BackendAccessor(BaseAccessor):
     ):
         self._backend = backend
 
+        # данные пишутся только из update() и читаются другими потоками:
+        # присваивание атрибута атомарно благодаря GIL, поэтому блокировки не нужны
         self._work_mode = init_work_mode
         self._codes_count = init_codes_count
 
-        # TODO: переработать механизм обновления данных для избавления от блокировок
-        self._lock = Lock()
-
     async def update(self) -> None:
         """
         Периодически обновляет данные, лежащие в экземпляре класса.
         """
         while True:
 
-            mode = await self._backend.get_mode()
+            # оба запроса выполняются одновременно (ошибки они логгируют сами и возвращают None)
+            mode, codes_count = await asyncio.gather(
+                self._backend.get_mode(),
+                self._backend.get_multipacks_after_pintset(),
+            )
+
             if mode is not None:
-                with self._lock:
-                    self._work_mode = mode
+                self._work_mode = mode
 
-            codes_count = await self._backend.get_multipacks_after_pintset()
             if codes_count is not None:
-                with self._lock:
-                    self._codes_count = codes_count
+                self._codes_count = codes_count
 
             await asyncio.sleep(10)
 
@@ -71,15 +71,13 @@ class BackendAccessor(BaseAccessor):
         """
         Возвращает ожидаемое кол-во кодов
         """
-        with self._lock:
-            return self._codes_count
+        return self._codes_count
 
     def get_current_work_mode(self) -> str:
         """
         Возвращает текущий режим работы
         """
-        with self._lock:
-            return self._work_mode
+        return self._work_mode
 
 
 class ImmutableAccessor(BaseAccessor):
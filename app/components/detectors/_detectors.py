@@ -1,15 +1,16 @@
 import abc
 import asyncio
-import time
-from threading import Lock
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional
 
 import cv2
 import numpy as np
-from tensorflow.lite.python.interpreter import Interpreter
+from loguru import logger
+from tensorflow.lite.python.interpreter import Interpreter, load_delegate
 
-from ._methods import get_neuronet_score, get_mog2_foreground_score
+from ._methods import get_neuronet_scores, set_neuronet_input, get_mog2_foreground_score
 from ..network_sources import Sensor
+from ...time_utils import RateLimiter
 
 
 class BaseDetector(metaclass=abc.ABCMeta):
@@ -40,6 +41,14 @@ class NeuronetDetector(BaseDetector):
     Parameters:
         model_path: путь к ``TF-Lite Flatbuffer`` файлу
         threshold_score: пороговое значение для активации критерия
+        batch_size: кол-во изображений, оцениваемых нейросетью за один запуск
+        num_threads: кол-во потоков, используемых интерпретатором
+            (``None`` - на усмотрение TF-Lite)
+        delegate_path: путь к библиотеке делегата TF-Lite (например, ``libedgetpu.so.1``);
+            если делегат не загрузится, модель будет исполняться на CPU
+        input_bgr: модель обучена на BGR-изображениях (кадры подаются без перевода в RGB)
+        background_inference: запускать нейросеть в отдельном потоке,
+            не дожидаясь её результата (он будет учтён при одном из следующих вызовов)
 
     Attributes:
         _THRESHOLD_SCORE: пороговое значение, меньше которого
@@ -51,17 +60,67 @@ class NeuronetDetector(BaseDetector):
             model_path: str,
             threshold_score: float = 0.6,
             pooling_period_sec: float = 0.5,
+            batch_size: int = 1,
+            num_threads: Optional[int] = None,
+            delegate_path: Optional[str] = None,
+            input_bgr: bool = False,
+            background_inference: bool = True,
     ):
-        self._interpreter = Interpreter(model_path=model_path)
+        assert 0 < batch_size, "Размер батча должен быть целым положительным числом"
+
+        # начиная с TF 2.5 float-модели по умолчанию исполняются SIMD-ядрами XNNPACK,
+        # которые распараллеливаются на num_threads потоков
+        self._interpreter = Interpreter(
+            model_path=model_path,
+            num_threads=num_threads,
+            experimental_delegates=self._load_delegates(delegate_path),
+        )
+
+        input_detail: dict = self._interpreter.get_input_details()[0]
+        _, height, width, channels = input_detail['shape']
+        self._interpreter.resize_tensor_input(input_detail['index'], [batch_size, height, width, channels])
         self._interpreter.allocate_tensors()
 
+        # описания тензоров не меняются между кадрами - получаем их один раз
+        self._input_detail: dict = self._interpreter.get_input_details()[0]
+        self._output_detail: dict = self._interpreter.get_output_details()[0]
+
         self._THRESHOLD_SCORE = threshold_score
+        self._BATCH_SIZE = batch_size
+        self._INPUT_BGR = input_bgr
 
-        self._POOLING_PERIOD_SEC = pooling_period_sec
-        self._last_pooling_time = time.monotonic() - pooling_period_sec
+        self._pooling_limiter = RateLimiter(pooling_period_sec)
+
+        # буфер для уменьшенного до размеров входа модели изображения
+        self._resize_buffer = np.empty((height, width, channels), dtype=np.uint8)
 
+        self._batch_length = 0
         self._recognized = False
 
+        # interpreter.invoke отпускает GIL, поэтому в отдельном потоке
+        # нейросеть работает параллельно с обработкой следующих кадров
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if background_inference:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='neuronet')
+        self._pending_scores: Optional[Future] = None
+
+    @staticmethod
+    def _load_delegates(delegate_path: Optional[str]) -> Optional[list]:
+        """
+        Загружает делегат TF-Lite (аппаратный ускоритель).
+        Возвращает ``None``, если делегат не задан или не загрузился.
+        """
+        if not delegate_path:
+            return None
+        try:
+            return [load_delegate(delegate_path)]
+        except (ValueError, OSError) as e:
+            logger.opt(exception=e).warning(
+                "Не удалось загрузить делегат TF-Lite '{}'. Модель будет исполняться на CPU",
+                delegate_path,
+            )
+            return None
+
     async def update(self):
         """НИЧЕГО НЕ ДЕЛАЕТ"""
 
@@ -69,13 +128,47 @@ class NeuronetDetector(BaseDetector):
         """
         Определяет, есть ли на изображении пачка.
         Если предыдущая проверка была недавно, то возвращает её результат.
+
+        Изображения копятся до заполнения батча, после чего оцениваются нейросетью разом.
+        Пока батч не заполнен (или ещё оценивается в фоне), возвращается результат
+        по предыдущему батчу (усреднённая оценка его изображений).
         """
-        if time.monotonic() - self._last_pooling_time > self._POOLING_PERIOD_SEC:
-            self._last_pooling_time = time.monotonic()
-            score = get_neuronet_score(self._interpreter, image)
-            self._recognized = score > self._THRESHOLD_SCORE
+        if self._pending_scores is not None:
+            if not self._pending_scores.done():
+                # входной тензор занят работающей нейросетью - кадр не учитывается
+                return self._recognized
+            self._set_recognized(self._pending_scores.result())
+            self._pending_scores = None
+
+        if self._pooling_limiter.is_ready():
+            set_neuronet_input(
+                self._interpreter,
+                image,
+                input_detail=self._input_detail,
+                batch_index=self._batch_length,
+                resize_buffer=self._resize_buffer,
+                input_bgr=self._INPUT_BGR,
+            )
+            self._batch_length += 1
+
+        if self._batch_length >= self._BATCH_SIZE:
+            self._batch_length = 0
+            if self._executor is None:
+                self._set_recognized(get_neuronet_scores(self._interpreter, output_detail=self._output_detail))
+            else:
+                self._pending_scores = self._executor.submit(
+                    get_neuronet_scores,
+                    self._interpreter,
+                    output_detail=self._output_detail,
+                )
         return self._recognized
 
+    def _set_recognized(self, scores: np.ndarray) -> None:
+        """
+        Обновляет результат распознавания по оценкам изображений батча.
+        """
+        self._recognized = scores.mean() > self._THRESHOLD_SCORE
+
 
 # TODO: починить код ниже от засветов (либо SaturationFilter, либо своя нейросеть) или удалить
 
@@ -90,9 +183,15 @@ class BackgroundDetector(BaseDetector):
     _LEARNING_RATE: float
     _SIZER: Optional[float]
     _REGION: tuple[float, float, float, float]
+    _IS_FULL_REGION: bool
+    _region_bounds: Optional[tuple[int, int, int, int]]
+    _region_image_shape: Optional[tuple[int, int]]
     _recognized: bool
     _recognize_counter: int
     _mog2: cv2.BackgroundSubtractorMOG2
+    _resize_buffer: Optional[np.ndarray]
+    _gray_buffer: Optional[np.ndarray]
+    _mask_buffer: Optional[np.ndarray]
 
     def __init__(
             self,
@@ -109,10 +208,19 @@ class BackgroundDetector(BaseDetector):
         self._LEARNING_RATE = learning_rate
         self._SIZER = size_multiplier
         self._REGION = (0, 0, 1, 1)
+        self._IS_FULL_REGION = self._REGION == (0, 0, 1, 1)
+
+        # границы области в пикселях (пересчитываются только при смене размера кадров)
+        self._region_bounds = None
+        self._region_image_shape = None
 
         self._recognized = False
         self._recognize_counter = 0
 
+        self._resize_buffer = None
+        self._gray_buffer = None
+        self._mask_buffer = None
+
         self._mog2 = cv2.createBackgroundSubtractorMOG2(detectShadows=True)
         if background is not None:
             _ = self._has_foreground(background)
@@ -133,27 +241,60 @@ class BackgroundDetector(BaseDetector):
             self._recognized = False
 
         # удержание в диапазоне
-        self._recognize_counter = max(self._recognize_counter, self._DEACTIVATION_COUNT)
-        self._recognize_counter = min(self._recognize_counter, self._ACTIVATION_COUNT)
+        self._recognize_counter = min(max(self._recognize_counter, self._DEACTIVATION_COUNT), self._ACTIVATION_COUNT)
 
         return self._recognized
 
     def _has_foreground(self, image: np.ndarray) -> bool:
-        image = self._get_region_from_image(image, self._REGION)
+        # сначала уменьшение, чтобы все последующие операции работали с меньшим кол-вом пикселей
+        # (область задана в долях изображения, поэтому от размера не зависит)
         if abs(self._SIZER - 1.0) > 1e-4:
-            image = cv2.resize(image, None, fx=self._SIZER, fy=self._SIZER)
+            image = self._get_resized(image)
+        if not self._IS_FULL_REGION:
+            image = self._get_region_from_image(image)
+        # буферы для серого изображения и маски выделяются только при смене размера кадров
+        if self._gray_buffer is None or self._gray_buffer.shape != image.shape[:2]:
+            self._gray_buffer = np.empty(image.shape[:2], dtype=np.uint8)
+            self._mask_buffer = np.empty(image.shape[:2], dtype=np.uint8)
+
+        # MOG2 моделирует каждый канал отдельно - на сером изображении работает втрое меньше
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._gray_buffer)
         learning_rate = self._LEARNING_RATE * (not self._recognized)
-        score = get_mog2_foreground_score(image, self._mog2, learning_rate=learning_rate)
+        score = get_mog2_foreground_score(
+            image,
+            self._mog2,
+            learning_rate=learning_rate,
+            mask=self._mask_buffer,
+        )
         return score > self._THRESHOLD_SCORE
 
-    @staticmethod
-    def _get_region_from_image(
-            image: np.ndarray,
-            region: tuple[float, float, float, float],
-    ) -> np.ndarray:
-        w, h = image.shape[:2][::-1]
-        x1, y1, x2, y2 = region
-        x1, y1, x2, y2 = map(int, (x1 * w, y1 * h, x2 * w, y2 * h))
+    def _get_resized(self, image: np.ndarray) -> np.ndarray:
+        """
+        Уменьшает изображение в заранее выделенный буфер
+        (память выделяется заново только при смене размера кадров).
+        """
+        # в отличие от основного уменьшения кадра (INTER_LINEAR ради скорости),
+        # здесь используется INTER_AREA: кадр уменьшается сильно и только для MOG2,
+        # а усреднение по площади гасит шум и мерцание, которые иначе
+        # попадали бы в маску переднего плана как ложные срабатывания
+        h, w = image.shape[:2]
+        size = max(1, int(w * self._SIZER)), max(1, int(h * self._SIZER))
+        if self._resize_buffer is None or self._resize_buffer.shape[1::-1] != size:
+            self._resize_buffer = np.empty((size[1], size[0], *image.shape[2:]), dtype=image.dtype)
+        cv2.resize(image, size, dst=self._resize_buffer, interpolation=cv2.INTER_AREA)
+        return self._resize_buffer
+
+    def _get_region_from_image(self, image: np.ndarray) -> np.ndarray:
+        """
+        Возвращает область ``_REGION`` изображения (без копирования).
+        """
+        if image.shape[:2] != self._region_image_shape:
+            h, w = image.shape[:2]
+            x1, y1, x2, y2 = self._REGION
+            self._region_bounds = int(x1 * w), int(y1 * h), int(x2 * w), int(y2 * h)
+            self._region_image_shape = image.shape[:2]
+
+        x1, y1, x2, y2 = self._region_bounds
         return image[y1:y2, x1:x2]
 
 
@@ -167,11 +308,9 @@ class SensorDetector(BaseDetector):
 
         self._POOLING_PERIOD_SEC = pooling_period_sec
 
+        # флаг пишется только из update() - присваивание атомарно благодаря GIL
         self._recognized = False
 
-        # TODO: переработать механизм обновления данных для избавления от блокировок
-        self._lock = Lock()
-
     async def update(self):
         """
         Регулярно получает актуальные данные от сенсора и устанавливает recognized-флаг
@@ -180,8 +319,7 @@ class SensorDetector(BaseDetector):
             status = await self._sensor.get_sensor_status()
 
             if status is not None:
-                with self._lock:
-                    self._recognized = status
+                self._recognized = status
 
             await asyncio.sleep(self._POOLING_PERIOD_SEC)
 
@@ -190,5 +328,4 @@ class SensorDetector(BaseDetector):
         Определяет наличие пачки через сенсор, игнорируя изображение.
         Если предыдущая проверка была недавно, то возвращает её результат.
         """
-        with self._lock:
-            return self._recognized
+        return self._recognized
@@ -1,7 +1,7 @@
 """
 Методы для определения объектов и событий с изображения.
 """
-from functools import reduce
+from typing import Optional
 
 import cv2
 import numpy as np
@@ -15,41 +15,105 @@ def get_normalized_sum(image: np.ndarray) -> float:
     а 0.0 - все были нулями.
     """
     max_value = np.iinfo(image.dtype).max
-    values_count = reduce(lambda x, y: x * y, image.shape)
-    score = np.sum(image, dtype=np.uint64) * (1 / (max_value * values_count))
+    if image.ndim <= 2 or (image.ndim == 3 and image.shape[2] <= 4):
+        # cv2.sumElems возвращает суммы по каналам (до 4-х) и считает их без приведения к uint64
+        total = sum(cv2.sumElems(image))
+    else:
+        # остальные формы массивов OpenCV не принимает
+        total = np.sum(image, dtype=np.uint64)
+    score = total * (1 / (max_value * image.size))
     return score
 
 
-def get_neuronet_score(interpreter: Interpreter, image: np.ndarray) -> float:
+def set_neuronet_input(
+        interpreter: Interpreter,
+        image: np.ndarray,
+        *,
+        input_detail: dict,
+        batch_index: int = 0,
+        resize_buffer: np.ndarray,
+        input_bgr: bool = False,
+) -> None:
+    """
+    Подготавливает изображение для нейросети и записывает его
+    прямо во входной тензор интерпретатора (на место ``batch_index`` в батче).
+
+    Изображение уменьшается в заранее выделенный буфер ``resize_buffer``
+    (размером со вход модели), там же переводится в RGB и без промежуточных
+    копий нормализуется/квантуется в память тензора.
+
+    ``input_detail`` - заранее полученное описание входа
+    (``interpreter.get_input_details()[0]``): оно не меняется между кадрами.
+
+    ``input_bgr=True`` - модель принимает изображения в BGR (как их отдаёт OpenCV),
+    перевод в RGB не нужен.
     """
-    Оценка наличия пачки на изображении, полученная от нейросети
+    height, width = resize_buffer.shape[:2]
+    cv2.resize(image, (width, height), dst=resize_buffer)
+    if not input_bgr:
+        cv2.cvtColor(resize_buffer, cv2.COLOR_BGR2RGB, resize_buffer)
+
+    input_tensor = interpreter.tensor(input_detail['index'])
+    write_model_input(resize_buffer, input_detail, out=input_tensor()[batch_index])
+
+
+def get_neuronet_scores(interpreter: Interpreter, *, output_detail: dict) -> np.ndarray:
+    """
+    Оценки наличия пачки на изображениях, уже записанных во входной тензор
+    (см. ``set_neuronet_input``), полученные от нейросети за один запуск.
 
     **Осторожно: очень долго (200мс/кадр) работает!**
 
     Args:
         interpreter: интерпретатор с уже загруженной и обученной нейросетью
-        image: изображение, которое нужно проверить
+        output_detail: заранее полученное описание выхода
+            (``interpreter.get_output_details()[0]``)
 
     Returns:
-        показатель движения на изображении
-            0.0 (движения нет) до 1.0 (на изображении двигаются все пиксели)
+        массив оценок для каждого изображения батча
+            от 0.0 (пачки нет) до 1.0 (пачка точно есть)
     """
-    input_detail: dict = interpreter.get_input_details()[0]
-    output_detail: dict = interpreter.get_output_details()[0]
+    interpreter.invoke()
 
-    input_size = tuple(input_detail['shape'][[2, 1]])
+    predict_values = interpreter.get_tensor(output_detail['index'])[:, 0]
+    return get_dequantized_output(predict_values, output_detail)
 
-    image = cv2.resize(image, input_size)
-    cv2.cvtColor(image, cv2.COLOR_BGR2RGB, image)
 
-    input_layer = np.expand_dims(image, axis=0)
-    input_layer = input_layer.astype(np.float32) * (1 / 255)
+def write_model_input(pixels: np.ndarray, input_detail: dict, *, out: np.ndarray) -> None:
+    """
+    Записывает uint8-пиксели в ``out`` в формате входа модели.
 
-    interpreter.set_tensor(input_detail['index'], input_layer)
-    interpreter.invoke()
+    Для float-моделей пиксели нормализуются в [0.0; 1.0].
+    Для квантованных (целочисленных) моделей пиксели переводятся в их шкалу,
+    а если шкала совпадает с самими пикселями (uint8, scale=1/255, zero_point=0),
+    то копируются как есть - без каких-либо преобразований.
+    """
+    dtype = input_detail['dtype']
+    if not np.issubdtype(dtype, np.integer):
+        np.multiply(pixels, dtype(1 / 255), out=out)
+        return
+
+    scale, zero_point = input_detail['quantization']
+    if dtype == np.uint8 and zero_point == 0 and abs(scale * 255 - 1.0) < 1e-6:
+        np.copyto(out, pixels)
+        return
+
+    quantized = np.round(pixels * (1 / (255 * scale)) + zero_point)
+    info = np.iinfo(dtype)
+    np.clip(quantized, info.min, info.max, out=quantized)
+    np.copyto(out, quantized, casting='unsafe')
 
-    predict_value = interpreter.get_tensor(output_detail['index'])[0][0]
-    return predict_value
+
+def get_dequantized_output(values: np.ndarray, output_detail: dict) -> np.ndarray:
+    """
+    Переводит выход квантованной модели в вещественные оценки.
+    Выход float-моделей возвращается без изменений.
+    """
+    if not np.issubdtype(output_detail['dtype'], np.integer):
+        return values
+
+    scale, zero_point = output_detail['quantization']
+    return (values.astype(np.float32) - zero_point) * scale
 
 
 def get_mog2_foreground_score(
@@ -57,10 +121,16 @@ def get_mog2_foreground_score(
         mog2: cv2.BackgroundSubtractorMOG2,
         *,
         learning_rate: float = 0.001,
+        mask: Optional[np.ndarray] = None,
 ) -> float:
     """
     Вычисление показателя различности изображения с фоном.
+
+    Если передан ``mask`` (uint8-массив с размерами изображения),
+    то маска переднего плана записывается в него, а не в новый массив.
     """
-    mask = mog2.apply(image, learningRate=learning_rate)
+    mask = mog2.apply(image, mask, learningRate=learning_rate)
+    # маска состоит из 0 (фон), 127 (тень) и 255 (объект):
+    # тени учитываются с половинным весом, поэтому countNonZero здесь не подходит
     score = get_normalized_sum(mask)
     return score
@@ -4,6 +4,19 @@ import aiohttp
 import pysnmp.hlapi.asyncio as snmp
 from loguru import logger
 
+_shared_engine: Optional[snmp.SnmpEngine] = None
+
+
+def _get_shared_engine() -> snmp.SnmpEngine:
+    """
+    Возвращает общий для всех snmp-устройств движок (создаёт его при первом обращении).
+    Один движок - один UDP-диспетчер и общий кэш вместо отдельных на каждое устройство.
+    """
+    global _shared_engine
+    if _shared_engine is None:
+        _shared_engine = snmp.SnmpEngine()
+    return _shared_engine
+
 
 class Backend:
     """
@@ -16,6 +29,29 @@ class Backend:
 
         self._TIMEOUT_SEC = timeout_sec
 
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Возвращает общую для всех запросов http-сессию (создаёт её при первом обращении).
+
+        Сессия держит открытыми соединения с бэкендом (keep-alive),
+        поэтому запросы не тратят время на установку нового соединения.
+        Должна использоваться из того eventloop'а, в котором выполняются запросы.
+        """
+        if self._session is None or self._session.closed:
+            timeout = aiohttp.ClientTimeout(total=self._TIMEOUT_SEC)
+            connector = aiohttp.TCPConnector(limit=32, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self) -> None:
+        """
+        Закрывает http-сессию и все её соединения.
+        """
+        if self._session is not None:
+            await self._session.close()
+
     async def get_mode(self) -> Optional[str]:
         """
         Получает режим работы с сервера.
@@ -28,11 +64,10 @@ class Backend:
 
         logger.debug('Получение данных о текущем режиме записи')
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(workmode_mapping, timeout=self._TIMEOUT_SEC) as resp:
-                    logger.debug(f"Статус ответа: {resp.status}")
-                    json_data = await resp.json()
-                    logger.debug(f"JSON из ответа: {json_data}")
+            async with self._get_session().get(workmode_mapping) as resp:
+                logger.debug(f"Статус ответа: {resp.status}")
+                json_data = await resp.json()
+                logger.debug(f"JSON из ответа: {json_data}")
             workmode = str(json_data['work_mode'])
             logger.debug(f"Полученный режим работы: {workmode}")
             return workmode
@@ -51,11 +86,10 @@ class Backend:
 
         logger.debug("Получение данных об ожидаемом кол-ве QR-кодов")
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(qr_count_mapping, timeout=self._TIMEOUT_SEC) as resp:
-                    logger.debug(f"Статус ответа: {resp.status}")
-                    json_data = await resp.json()
-                    logger.debug(f"JSON из ответа: {json_data}")
+            async with self._get_session().get(qr_count_mapping) as resp:
+                logger.debug(f"Статус ответа: {resp.status}")
+                json_data = await resp.json()
+                logger.debug(f"JSON из ответа: {json_data}")
             packs_in_block = int(json_data['params']['multipacks_after_pintset'])
             logger.debug(f"Полученное кол-во кодов: {packs_in_block}")
             return packs_in_block
@@ -72,8 +106,7 @@ class Backend:
         """
         success_pack_mapping = f'http://{self._domain}/api/v1_0/new_pack_after_pintset'
 
-        logger.debug("Отправка пары кодов на сервер: "
-                     f"QR-код: {qr_code} штрих-код: {barcode}")
+        logger.debug("Отправка пары кодов на сервер: QR-код: {} штрих-код: {}", qr_code, barcode)
 
         json4send = {
             'qr': qr_code,
@@ -81,15 +114,15 @@ class Backend:
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.put(
-                        url=success_pack_mapping,
-                        json=json4send,
-                        timeout=self._TIMEOUT_SEC,
-                ) as resp:
-                    logger.debug(f"Статус ответа: {resp.status}")
-                    json_data = await resp.json()
-                    logger.debug(f"JSON из ответа: {json_data}")
+            async with self._get_session().put(
+                    url=success_pack_mapping,
+                    json=json4send,
+            ) as resp:
+                logger.debug("Статус ответа: {}", resp.status)
+                # содержимое ответа нигде не используется, поэтому не разбирается как JSON,
+                # но дочитывается: иначе соединение не вернётся в пул keep-alive
+                body = await resp.read()
+                logger.debug("Тело ответа: {}", body)
         except Exception as e:
             logger.opt(exception=e).error("Ошибка при попытке отправки пары кодов на сервер")
 
@@ -108,7 +141,7 @@ class Shutter:
             engine: snmp.SnmpEngine = None,
     ):
         if engine is None:
-            engine = snmp.SnmpEngine()
+            engine = _get_shared_engine()
 
         self._engine = engine
         self._transport = snmp.UdpTransportTarget((domain, port))
@@ -179,7 +212,7 @@ class Sensor:
             engine: snmp.SnmpEngine = None,
     ):
         if engine is None:
-            engine = snmp.SnmpEngine()
+            engine = _get_shared_engine()
 
         self._engine = engine
         self._transport = snmp.UdpTransportTarget((domain, port))
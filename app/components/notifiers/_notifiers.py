@@ -33,9 +33,12 @@ class AbstractBackendNotifier(BaseNotifier, metaclass=abc.ABCMeta):
         """
         Отправляет корректные коды бэкенду
         """
-        logger.info(f"Отправка бэкенду кодов: {pack_data}")
-        for qr, bar in zip(pack_data['QRCODE'], pack_data['EAN13']):
-            await self._backend.send_codepair(qr, bar)
+        logger.opt(lazy=True).info("Отправка бэкенду кодов: {}", lambda: pack_data)
+        # пары отправляются одновременно: время отправки пачки - одна задержка сети, а не N
+        await asyncio.gather(*(
+            self._backend.send_codepair(qr, bar)
+            for qr, bar in zip(pack_data['QRCODE'], pack_data['EAN13'])
+        ))
 
 
 class EmptyLoggingNotifier(BaseNotifier):
@@ -45,11 +48,11 @@ class EmptyLoggingNotifier(BaseNotifier):
 
     async def notify_about_good_pack(self, pack_data: dict) -> None:
         """Заглушка для логирования"""
-        logger.debug(f"Извещение о корректной пачке: {pack_data}")
+        logger.opt(lazy=True).debug("Извещение о корректной пачке: {}", lambda: pack_data)
 
     async def notify_about_bad_pack(self, pack_data: dict) -> None:
         """Заглушка для логирования"""
-        logger.debug(f"Извещение о некорректной пачке: {pack_data}")
+        logger.opt(lazy=True).debug("Извещение о некорректной пачке: {}", lambda: pack_data)
 
 
 class AbstractShutterNotifier(BaseNotifier, metaclass=abc.ABCMeta):
@@ -73,7 +76,7 @@ class AbstractShutterNotifier(BaseNotifier, metaclass=abc.ABCMeta):
         self._WAIT_OPEN_SEC = wait_open_sec
 
         self._is_shutter_open = False
-        self._shutter_close_time = time.monotonic()
+        self._shutter_close_time_ns = time.monotonic_ns()
 
     async def _drop_pack(self) -> None:
         """
@@ -82,7 +85,7 @@ class AbstractShutterNotifier(BaseNotifier, metaclass=abc.ABCMeta):
         новая группа пачек, то заслонка остаётся в открытом состоянии.
         """
         awake_time = self._WAIT_BEFORE_SEC + self._WAIT_OPEN_SEC
-        self._shutter_close_time = time.monotonic() + awake_time
+        self._shutter_close_time_ns = time.monotonic_ns() + int(awake_time * 1e9)
 
         await asyncio.sleep(self._WAIT_BEFORE_SEC)
         if not self._is_shutter_open:
@@ -91,7 +94,8 @@ class AbstractShutterNotifier(BaseNotifier, metaclass=abc.ABCMeta):
             await self._shutter.open()
 
         await asyncio.sleep(self._WAIT_OPEN_SEC)
-        if self._is_shutter_open and time.monotonic() > self._shutter_close_time - 1e-3:
+        # допуск в 1мс на неточность asyncio.sleep
+        if self._is_shutter_open and time.monotonic_ns() + 1_000_000 > self._shutter_close_time_ns:
             self._is_shutter_open = False
             logger.info("Закрыта заслонка - окончание сброса пачек")
             await self._shutter.close()
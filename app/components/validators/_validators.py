@@ -1,9 +1,19 @@
 import abc
-import copy
+import re
+from functools import lru_cache
 
 from loguru import logger
 
 
+@lru_cache(maxsize=16)
+def _get_empty_codes(expected: int) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """
+    Возвращает шаблонные (пустые) QR- и штрих-коды для пачки из ``expected`` кодов.
+    Кол-во ожидаемых кодов почти не меняется, поэтому шаблоны кэшируются.
+    """
+    return ('',) * expected, ('0' * 13,) * expected
+
+
 class BaseValidator(metaclass=abc.ABCMeta):
     """
     Базовый класс для валидаторов пачек.
@@ -38,27 +48,37 @@ class CodesCountValidator(BaseValidator):
         self._reject_if_more = reject_if_more
         self._replace_if_reject = replace_empty_if_reject
 
+        # все запрещённые подстроки ищутся одним регулярным выражением за один проход по коду
+        self._blacklist_re = None
+        if self.blacklisted_qrs:
+            self._blacklist_re = re.compile('|'.join(map(re.escape, self.blacklisted_qrs)))
+
     def get_validated(self, pack_data: dict) -> dict:
         """
         Удаляет из данных пачки пары с запрещёнными QR-кодами и
         валидирует пачку по кол-ву ожидаемых и найденных кодов.
         """
-        logger.info(f"Получены данные пачки для валидации: {pack_data}")
+        # lazy=True: словарь превращается в строку, только если сообщение действительно попадёт в лог
+        logger.opt(lazy=True).info("Получены данные пачки для валидации: {}", lambda: pack_data)
 
-        pack_data = copy.deepcopy(pack_data)
+        # изменяются только списки кодов - достаточно скопировать их, а не всю структуру
+        pack_data = {
+            **pack_data,
+            'QRCODE': list(pack_data['QRCODE']),
+            'EAN13': list(pack_data['EAN13']),
+        }
 
         pack_data['QRCODE'] = self._get_non_blacklisted_qr_codes(pack_data['QRCODE'])
-        while len(pack_data['EAN13']) > len(pack_data['QRCODE']):
-            pack_data['EAN13'].pop()
+        del pack_data['EAN13'][len(pack_data['QRCODE']):]
 
         expected_count = pack_data['expected']
         actual_count = len(pack_data['QRCODE'])
 
         pack_data['is_valid'] = self._is_correct_codes_count(actual_count, expected_count)
         if pack_data['is_valid']:
-            logger.info(f"Пачка {pack_data} помечена корректной")
+            logger.opt(lazy=True).info("Пачка {} помечена корректной", lambda: pack_data)
         else:
-            logger.info(f"Пачка {pack_data} помечена НЕкорректной")
+            logger.opt(lazy=True).info("Пачка {} помечена НЕкорректной", lambda: pack_data)
             if self._replace_if_reject:
                 logger.info("Некорректная пачка заменена пустой")
                 pack_data = self._get_empty_pack(expected_count)
@@ -69,47 +89,41 @@ class CodesCountValidator(BaseValidator):
         """
         Удаляет пары кодов, среди которых найдены запрещённые.
         """
+        if self._blacklist_re is None:
+            return qrs
+
         new_qrs = []
         for qr_code in qrs:
-
-            is_ignored = False
-            for blacklisted in self.blacklisted_qrs:
-                if blacklisted in qr_code:
-                    logger.info(f"Код '{qr_code}' был удалён из пачки, "
-                                "т.к. находится в чёрном списке")
-                    is_ignored = True
-                    break
-
-            if not is_ignored:
-                new_qrs.append(qr_code)
+            if self._blacklist_re.search(qr_code):
+                logger.info("Код '{}' был удалён из пачки, т.к. находится в чёрном списке", qr_code)
+                continue
+            new_qrs.append(qr_code)
         return new_qrs
 
     def _is_correct_codes_count(self, actual_count: int, expected_count: int) -> bool:
         """
         Проверяет, соответствует ли кол-во кодов ожидаемому.
         """
-        if actual_count > expected_count:
-            logger.info("Количество кодов больше ожидаемого "
-                        f"({actual_count} > {expected_count})")
-            if self._reject_if_more:
-                return False
+        # большинство пачек корректны - для них достаточно одного сравнения
+        if actual_count == expected_count:
+            return True
 
-        if actual_count < expected_count:
-            logger.info(f"Количество кодов меньше ожидаемого "
-                        f"({actual_count} < {expected_count})")
-            if self._reject_if_less:
-                return False
+        if actual_count > expected_count:
+            logger.info("Количество кодов больше ожидаемого ({} > {})", actual_count, expected_count)
+            return not self._reject_if_more
 
-        return True
+        logger.info("Количество кодов меньше ожидаемого ({} < {})", actual_count, expected_count)
+        return not self._reject_if_less
 
     @staticmethod
     def _get_empty_pack(expected: int) -> dict:
         """
         Создаёт пустую пачку.
         """
+        qr_codes, barcodes = _get_empty_codes(expected)
         return dict(
-            QRCODE=[''] * expected,
-            EAN13=['0' * 13] * expected,
+            QRCODE=list(qr_codes),
+            EAN13=list(barcodes),
             is_valid=False,
             expected=expected,
         )
@@ -83,12 +83,19 @@ class Detectors(containers.DeclarativeContainer):
         model_path=config.Neuronet.model_path,
         threshold_score=config.Neuronet.threshold,
         pooling_period_sec=config.Neuronet.pooling_period_sec,
+        batch_size=config.Neuronet.batch_size,
+        num_threads=config.Neuronet.num_threads,
+        delegate_path=config.Neuronet.delegate_path,
+        input_bgr=config.Neuronet.input_bgr,
+        background_inference=config.Neuronet.background_inference,
     )
 
     _BackgroundDetector = providers.Singleton(
         detectors.BackgroundDetector,
         learning_rate=config.Background.learning_rate,
+        activation_interval=config.Background.activation_interval,
         threshold_score=config.Background.threshold_score,
+        size_multiplier=config.Background.size_multiplier,
     )
 
     _SensorDetector = providers.Singleton(
@@ -200,5 +207,8 @@ class Application(containers.DeclarativeContainer):
     get_log_format = config.log_format
 
     get_video_path = config.video_path
+    get_video_capture_api = config.video_capture_api
+    get_video_drop_old_frames = config.video_drop_old_frames
     get_video_sizer = config.video_sizer
     get_show_video = config.video_show
+    get_detector_stride = config.video_detector_stride
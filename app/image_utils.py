@@ -2,6 +2,9 @@
 Универсальные функции для обработки изображений, которые облегчают жизнь.
 Делают простые действия и не зависят от конкретного проекта.
 """
+import threading
+from functools import lru_cache
+from typing import Optional
 
 import cv2
 import numpy as np
@@ -13,11 +16,18 @@ __all__ = [
     'get_sliced_image',
     'get_undistorded_fisheye',
     'get_codes_from_image',
+    'get_image_hash',
     'sharpen_image',
     'draw_text',
     'draw_circle',
 ]
 
+# буферы, переиспользуемые между вызовами (свои для каждого потока)
+_thread_buffers = threading.local()
+
+# типы кодов, которые ищет zbar
+_ZBAR_SYMBOLS = (ZBarSymbol.EAN13, ZBarSymbol.QRCODE)
+
 
 def get_sliced_image(
         image: np.ndarray,
@@ -29,13 +39,17 @@ def get_sliced_image(
     Возвращает фрагмент исходного изображения (без копирования).
     Срез задаётся числами с плавающей точкой - [0.0; 1.0].
     """
-    w, h = image.shape[:2][::-1]
+    if w_slice == (0.0, 1.0) and h_slice == (0.0, 1.0):
+        # срез на всё изображение - резать нечего
+        return image
 
-    w_slice = int(w * w_slice[0]), int(w * w_slice[1])
-    h_slice = int(h * h_slice[0]), int(h * h_slice[1])
+    h, w = image.shape[:2]
+
+    x0, x1 = int(w * w_slice[0]), int(w * w_slice[1])
+    y0, y1 = int(h * h_slice[0]), int(h * h_slice[1])
 
     # no copy
-    return image[h_slice[0]:h_slice[1], w_slice[0]:w_slice[1]]
+    return image[y0:y1, x0:x1]
 
 
 def get_undistorded_fisheye(
@@ -48,12 +62,18 @@ def get_undistorded_fisheye(
         sizer: float = 1.0,
         focal_x: float = 1000,
         focal_y: float = 1000,
-):
+        dst: Optional[np.ndarray] = None,
+) -> np.ndarray:
     """
     Исправление дефекта рыбьего глаза
 
+    Карты преобразования зависят только от размера кадра и параметров камеры,
+    поэтому строятся один раз и кэшируются, а на каждый кадр выполняется только remap.
+
     Params:
         frame: входное изображение
+        dst: буфер для результата (размером с уменьшенный кадр, не сам ``frame``) -
+            при обработке видео позволяет не выделять память под каждый кадр
 
     Return:
         result: исправленное изображение
@@ -63,12 +83,32 @@ def get_undistorded_fisheye(
 
     h, w = frame.shape[:2]
 
+    # фокусное расстояние с учётом предварительного изменения размера
+    map1, map2 = _get_undistort_maps(h, w, k1, k2, p1, p2, focal_x * sizer, focal_y * sizer)
+    return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=dst)
+
+
+@lru_cache(maxsize=4)
+def _get_undistort_maps(
+        h: int,
+        w: int,
+        k1: float,
+        k2: float,
+        p1: float,
+        p2: float,
+        focal_x: float,
+        focal_y: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Строит карты для исправления дефекта рыбьего глаза через ``cv2.remap``
+    (то же самое ``cv2.undistort`` делает внутри себя на каждый вызов).
+    Карты в формате CV_16SC2 (целочисленные) вдвое компактнее вещественных.
+    """
     # заполняем матрицу преобразования 3x3
     cam = np.identity(3, dtype=np.float64)
 
-    # фокусное расстояние с учётом предварительного изменения размера
-    cam[0, 0] = focal_x * sizer
-    cam[1, 1] = focal_y * sizer
+    cam[0, 0] = focal_x
+    cam[1, 1] = focal_y
     cam[2, 2] = 1.0
 
     # центр
@@ -80,7 +120,7 @@ def get_undistorded_fisheye(
         dtype=np.float64,
     ).reshape((4, 1))
 
-    return cv2.undistort(frame, cam, coeff, None, None)
+    return cv2.initUndistortRectifyMap(cam, coeff, None, cam, (w, h), cv2.CV_16SC2)
 
 
 def get_codes_from_image(
@@ -112,39 +152,73 @@ def get_codes_from_image(
     if sizer != 1.0:
         image = cv2.resize(image, None, fx=sizer, fy=sizer)
 
-    gray: np.ndarray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    cv2.threshold(gray, None, 255, cv2.THRESH_OTSU, dst=gray)
+    gray = _get_thread_buffer('gray', image.shape[:2])
+    cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+    binary = _get_thread_buffer('binary', image.shape[:2])
+    cv2.threshold(gray, 0, 255, cv2.THRESH_OTSU, dst=binary)
 
-    symbols = [ZBarSymbol.EAN13, ZBarSymbol.QRCODE]
-
-    decoded_values: list = pyzbar.decode(gray, symbols)
+    decoded_values: list = [decoded for decoded in pyzbar.decode(binary, _ZBAR_SYMBOLS)
+                            if decoded.data != b'']
     if len(decoded_values) == 0:
-        decoded_values = pyzbar.decode(image, symbols)
+        # на плохих кадрах собственная бинаризация zbar часто справляется лучше, чем Оцу
+        decoded_values = [decoded for decoded in pyzbar.decode(gray, _ZBAR_SYMBOLS)
+                          if decoded.data != b'']
 
-    decoded_values = [decoded for decoded in decoded_values
-                      if decoded.data != b'']
+    seen_codes: dict[str, set[str]] = {
+        QR_CODE: set(),
+        BARCODE: set(),
+    }
 
     for decoded in decoded_values:
-        code_data = bytes.decode(decoded.data, encoding='utf-8', errors='ignore')
-        if code_data in codes[decoded.type]:
+        code_data = decoded.data.decode('utf-8', errors='ignore')
+        if decoded.type == BARCODE and len(code_data) < 13:
             continue
+        if code_data in seen_codes[decoded.type]:
+            continue
+        seen_codes[decoded.type].add(code_data)
         codes[decoded.type].append(code_data)
 
-    codes[BARCODE] = [code for code in codes[BARCODE]
-                      if len(code) >= 13]
     return codes
 
 
+def _get_thread_buffer(name: str, shape: tuple[int, ...], dtype: type = np.uint8) -> np.ndarray:
+    """
+    Возвращает буфер нужной формы и типа, принадлежащий текущему потоку.
+    Память выделяется заново только при смене формы или типа.
+    """
+    buffer = getattr(_thread_buffers, name, None)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = np.empty(shape, dtype=dtype)
+        setattr(_thread_buffers, name, buffer)
+    return buffer
+
+
+def get_image_hash(
+        image: np.ndarray,
+        *,
+        hash_size: tuple[int, int] = (16, 9),
+) -> bytes:
+    """
+    Возвращает грубый хэш изображения (average hash).
+
+    Изображение сжимается до ``hash_size`` и бинаризуется по среднему значению,
+    поэтому одинаковые и почти одинаковые кадры получают одинаковый хэш.
+    Работает на порядки быстрее любого детектора или чтения кодов.
+    """
+    small = cv2.resize(image, hash_size, interpolation=cv2.INTER_AREA)
+    return np.packbits(small > small.mean()).tobytes()
+
+
 def sharpen_image(image: np.ndarray) -> None:
     """
     Делает контуры изображения более резкими (без копирования).
     """
-    sharpen_kernel = np.array([
-        [-1, -1, -1],
-        [-1, +9, -1],
-        [-1, -1, -1],
-    ])
-    cv2.filter2D(image, -1, sharpen_kernel, image)
+    # свёртка с ядром [[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]] равна 10 * image - 9 * mean3x3(image):
+    # сепарабельный boxFilter и addWeighted дешевле плотной свёртки 3x3,
+    # а среднее в float32 не даёт ошибок округления
+    blurred = _get_thread_buffer('sharpen_blur', image.shape, np.float32)
+    cv2.boxFilter(image, cv2.CV_32F, (3, 3), dst=blurred)
+    cv2.addWeighted(image, 10.0, blurred, -9.0, 0.0, dst=image, dtype=cv2.CV_8U)
 
 
 def draw_text(
@@ -6,22 +6,53 @@ import asyncio
 import sys
 from datetime import datetime
 from pathlib import Path
+from shutil import copyfile
 
 from loguru import logger
 
+try:
+    # более быстрая реализация eventloop'а на libuv (недоступна на Windows)
+    import uvloop
+except ImportError:
+    uvloop = None
+
 from app.di_containers import Application
 from app.processing import process_video
 
+# конфиг ищется в текущей рабочей директории, образец лежит в корне проекта
+_CONFIG_PATH = Path('config.yaml')
+_SAMPLE_CONFIG_PATH = Path(__file__).resolve().parent.parent / 'sample_config.yaml'
+
+# значения по умолчанию для ключей, которых может не быть в конфигах,
+# созданных до их появления в sample_config.yaml (config.yaml поверх них не перезаписывается)
+_CONFIG_DEFAULTS = {
+    'video_capture_api': 'ANY',
+    'video_detector_stride': 1,
+    'video_drop_old_frames': None,
+    'detection': {
+        'Neuronet': {
+            'batch_size': 1,
+            'num_threads': None,
+            'delegate_path': None,
+            'input_bgr': False,
+            'background_inference': True,
+        },
+        'Background': {
+            'activation_interval': (15, -20),
+            'size_multiplier': 1.0,
+        },
+    },
+}
+
 
 def create_yaml_config_if_no_exists():
     """
     Копирует .yaml конфиг с настройками по умолчанию,
     если не находит других конфигов.
     """
-    if not (Path('.') / f"config.yaml").is_file():
+    if not _CONFIG_PATH.is_file():
         print("Not found existing config.yaml. Creating new one")
-        from shutil import copyfile
-        copyfile(Path(__file__).parent.parent / 'sample_config.yaml', './config.yaml')
+        copyfile(_SAMPLE_CONFIG_PATH, _CONFIG_PATH)
 
 
 def get_complete_di_container() -> Application:
@@ -33,7 +64,9 @@ def get_complete_di_container() -> Application:
         Application
     """
     container = Application()
-    container.config.from_yaml('config.yaml')
+    # значения из config.yaml объединяются со значениями по умолчанию, а не заменяют их целиком
+    container.config.from_dict(_CONFIG_DEFAULTS)
+    container.config.from_yaml(_CONFIG_PATH)
     return container
 
 
@@ -68,7 +101,10 @@ def get_running_parallel_eventloop() -> asyncio.AbstractEventLoop:
         """
         loop.run_forever()
 
-    eventloop = asyncio.new_event_loop()
+    if uvloop is not None:
+        eventloop = uvloop.new_event_loop()
+    else:
+        eventloop = asyncio.new_event_loop()
     # делает переданный eventloop стандартным для потока, в котором исполняется
     asyncio.set_event_loop(eventloop)
 
@@ -81,6 +117,18 @@ def get_running_parallel_eventloop() -> asyncio.AbstractEventLoop:
     return eventloop
 
 
+def close_network_sources(container: Application, eventloop: asyncio.AbstractEventLoop) -> None:
+    """
+    Закрывает открытые соединения сетевых устройств перед завершением программы.
+    """
+    backend = container.network.Backend()
+    future = asyncio.run_coroutine_threadsafe(backend.close(), eventloop)
+    try:
+        future.result(timeout=5)
+    except Exception as e:
+        logger.opt(exception=e).warning("Не удалось корректно закрыть соединения с бэкендом")
+
+
 def main() -> None:
     """
     Запускает обработку видео с извещение бэкенда и логгированием происходящих событий.
@@ -88,10 +136,23 @@ def main() -> None:
     create_yaml_config_if_no_exists()
 
     container = get_complete_di_container()
+
+    # простые значения из конфига читаются один раз:
+    # каждое обращение к провайдеру заново проходит по дереву конфигурации
+    log_path = container.get_log_path()
+    log_format = container.get_log_format()
+    log_level = container.get_log_level()
+    video_path = container.get_video_path()
+    video_capture_api = container.get_video_capture_api()
+    video_drop_old_frames = container.get_video_drop_old_frames()
+    video_sizer = container.get_video_sizer()
+    show_video = container.get_show_video()
+    detector_stride = container.get_detector_stride()
+
     setup_logger(
-        file=container.get_log_path(),
-        log_format=container.get_log_format(),
-        level=container.get_log_level(),
+        file=log_path,
+        log_format=log_format,
+        level=log_level,
     )
     logger.info(f"local time is {datetime.now()!s}")
 
@@ -108,18 +169,24 @@ def main() -> None:
     logger.info("Программа запущена")
     try:
         process_video(
-            video_path=container.get_video_path(),
+            video_path=video_path,
+            capture_api=video_capture_api,
+            drop_old_frames=video_drop_old_frames,
             detector=detector,
             accessor=accessor,
             validator=container.validation.Validator(),
             notifier=container.notification.Notifier(),
             eventloop=eventloop,
-            video_sizer=container.get_video_sizer(),
+            video_sizer=video_sizer,
+            show_video=show_video,
+            detector_stride=detector_stride,
         )
     except KeyboardInterrupt:
         logger.info("Программа была остановлена пользователем (Ctrl+C)")
     except BaseException as e:
         logger.opt(exception=e).critical("Программа была неожиданно завершена из-за ошибки")
+
+    close_network_sources(container, eventloop)
     logger.info("Программа завершена")
 
 
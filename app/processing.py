@@ -2,9 +2,13 @@
 Главный метод обработки видео.
 """
 import asyncio
-import copy
+import os
+import time
 from collections import deque
 from multiprocessing.pool import ThreadPool as Pool
+from queue import Empty, Full, Queue
+from threading import Thread
+from typing import Optional
 
 import cv2
 import numpy as np
@@ -15,42 +19,165 @@ from .components.detectors import BaseDetector
 from .components.notifiers import BaseNotifier
 from .components.validators import BaseValidator
 
-from .image_utils import get_codes_from_image, get_sliced_image
+from .image_utils import get_codes_from_image, get_image_hash, get_sliced_image
+from .time_utils import RateLimiter
 
 
-def assert_video_is_ok(video_path: str) -> None:
+def get_capture_api(name: str) -> int:
+    """
+    Возвращает идентификатор бэкенда видеозахвата OpenCV по его имени
+    ('ANY', 'FFMPEG', 'GSTREAMER', 'V4L2' и т.д.).
+    """
+    api = getattr(cv2, f'CAP_{name.upper()}', None)
+    assert api is not None, f"Неизвестный бэкенд видеозахвата: {name}"
+    return api
+
+
+def assert_video_is_ok(video_path: str, *, capture_api: int = cv2.CAP_ANY) -> None:
     """
     Проверяет, что видео доступно и читается.
     Если нет - выкидывает AssertionError.
     """
     cap = cv2.VideoCapture()
-    cap.open(video_path)
+    cap.open(video_path, capture_api)
     assert cap.isOpened(), "Видеопоток не открыт!"
     is_exists, _ = cap.read()
     assert is_exists, "Не удалось получить кадр видеопотока!"
     cap.release()
 
 
-class FakeApplyResult:
-    """
-    Заглушка для будущей многопоточной обработки
+class FrameReader(Thread):
     """
+    Читает кадры видеопотока в отдельном потоке исполнения
+    и складывает их в ограниченную очередь.
+
+    ``cv2.VideoCapture.read`` отпускает GIL на время декодирования,
+    поэтому чтение следующего кадра идёт параллельно с обработкой текущего.
+    При потере видеопотока переподключается к нему
+    (с растущей паузой между неудачными попытками).
 
-    def __init__(self, data):
-        self.data = data
+    ``capture_api`` позволяет выбрать бэкенд декодирования (например, cv2.CAP_GSTREAMER,
+    тогда ``video_path`` может быть GStreamer-конвейером с аппаратным декодером).
 
-    @staticmethod
-    def ready():
+    Если обработка не поспевает за видео и ``drop_old_frames=True``,
+    то из переполненной очереди выбрасываются самые старые кадры:
+    обрабатываться всегда будут самые свежие кадры, а не накопившиеся.
+    Для видеофайлов это не нужно (файл никуда не убегает), и с ``drop_old_frames=False``
+    чтение просто ждёт, пока в очереди освободится место - обрабатывается каждый кадр.
+
+    С ``decode_stride=N`` декодируется и попадает в очередь только каждый N-ый кадр,
+    остальные лишь забираются из потока (``grab`` без ``retrieve``) - их никто не обработает.
+
+    Если поток чтения упал с ошибкой, то она логгируется и выбрасывается повторно из ``read``.
+    """
+
+    def __init__(
+            self,
+            video_path: str,
+            *,
+            capture_api: int = cv2.CAP_ANY,
+            capture_buffer_size: int = 6,
+            queue_size: int = 2,
+            drop_old_frames: bool = True,
+            decode_stride: int = 1,
+            max_reconnect_delay_sec: float = 5.0,
+    ):
+        # daemon=True - поток не помешает завершению программы
+        super().__init__(daemon=True)
+        self._video_path = video_path
+        self._capture_api = capture_api
+        self._capture_buffer_size = capture_buffer_size
+        self._drop_old_frames = drop_old_frames
+        self._DECODE_STRIDE = decode_stride
+        self._MAX_RECONNECT_DELAY_SEC = max_reconnect_delay_sec
+        self._IS_FILE = os.path.isfile(video_path)
+        self._frames = Queue(maxsize=queue_size)
+        self._error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        try:
+            self._read_frames()
+        except Exception as e:
+            logger.opt(exception=e).critical("Поток чтения видео завершился из-за ошибки")
+            self._error = e
+
+    def _read_frames(self) -> None:
         """
-        Говорит о готовности 'многопоточной' задачи
+        Бесконечно читает кадры видеопотока в очередь.
         """
-        return True
+        cap = cv2.VideoCapture(self._video_path, self._capture_api)
+
+        # уменьшение размера буффера
+        # (если обработка видео будет запаздывать,
+        # то большой буффер будет приводить к задержкам)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, self._capture_buffer_size)
+
+        reconnect_delay_sec = 0.1
+        frame_index = 0
+
+        while True:
+            # grab только забирает кадр из потока, а retrieve превращает его в изображение:
+            # кадры между каждым decode_stride-ым не декодируются.
+            # Остальные декодируются все - при отставании обработки свежий кадр
+            # вытесняет из очереди самый старый, а не наоборот
+            exists = cap.grab()
+            if exists:
+                is_skipped = frame_index % self._DECODE_STRIDE != 0
+                frame_index += 1
+                if is_skipped:
+                    continue
+                exists, frame = cap.retrieve()
+
+            if not exists:
+                if self._IS_FILE:
+                    logger.info("Видеофайл закончился. Чтение с начала")
+                else:
+                    logger.error("Видеопоток: кадр не был получен. Переподключение через {} сек.",
+                                 reconnect_delay_sec)
+                # старый декодер освобождается сразу, а не при следующем open
+                cap.release()
+                time.sleep(reconnect_delay_sec)
+                reconnect_delay_sec = min(reconnect_delay_sec * 2, self._MAX_RECONNECT_DELAY_SEC)
+                cap.open(self._video_path, self._capture_api)
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, self._capture_buffer_size)
+                continue
+
+            reconnect_delay_sec = 0.1
 
-    def get(self):
+            if self._drop_old_frames:
+                self._put_dropping_oldest(frame)
+            else:
+                self._frames.put(frame)
+
+    def _put_dropping_oldest(self, frame: np.ndarray) -> None:
+        """
+        Кладёт кадр в очередь, выбрасывая из неё самые старые кадры при переполнении.
+        """
+        while True:
+            try:
+                self._frames.put_nowait(frame)
+                return
+            except Full:
+                pass
+            try:
+                self._frames.get_nowait()
+            except Empty:
+                pass
+
+    def read(self) -> np.ndarray:
         """
-        Возвращает результаты обработки
+        Возвращает очередной кадр (ждёт его появления, если очередь пуста).
+        Если поток чтения завершился, выбрасывает его ошибку.
         """
-        return self.data
+        while True:
+            try:
+                return self._frames.get(timeout=1.0)
+            except Empty:
+                # без этой проверки упавший поток чтения оставил бы обработку ждать вечно
+                if not self.is_alive():
+                    if self._error is not None:
+                        raise self._error
+                    raise RuntimeError("Поток чтения видео завершился")
 
 
 def process_frame(frame: np.ndarray, *, sizer: float = 1.0) -> np.ndarray:
@@ -59,6 +186,8 @@ def process_frame(frame: np.ndarray, *, sizer: float = 1.0) -> np.ndarray:
     (позиции, bounding box'ы, предобработанные изображения)
     в виде кортежа или словаря.
     """
+    if sizer == 1.0:
+        return frame
     return cv2.resize(frame, None, fx=sizer, fy=sizer)
 
 
@@ -74,6 +203,29 @@ def get_codes_image_region(full_image: np.ndarray) -> np.ndarray:
     return conveyor
 
 
+def add_new_codes(
+        record: dict,
+        codes: dict,
+        seen_codes: dict[str, set[str]],
+        *,
+        max_codes_per_pack: int,
+) -> None:
+    """
+    Дополняет данные пачки кодами, прочитанными с очередного кадра (без повторений).
+    ``seen_codes`` - множества уже добавленных в пачку кодов каждого типа
+    (для проверки повторов без просмотра всего списка).
+    """
+    for code_type, new_codes in codes.items():
+        known_codes = record[code_type]
+        seen = seen_codes[code_type]
+        for code in new_codes:
+            if len(known_codes) >= max_codes_per_pack:
+                break
+            if code not in seen:
+                seen.add(code)
+                known_codes.append(code)
+
+
 def process_video(
         video_path: str,
         detector: BaseDetector,
@@ -82,10 +234,16 @@ def process_video(
         validator: BaseValidator,
         eventloop: asyncio.AbstractEventLoop,
         *,
+        capture_api: str = 'ANY',
         capture_buffer_size: int = 6,
+        drop_old_frames: Optional[bool] = None,
         threads_count: int = None,
         video_sizer: float = 1.0,
+        max_codes_per_pack: int = 64,
+        detector_stride: int = 1,
+        max_same_frame_skips: int = 5,
         show_video: bool = True,
+        show_video_period_sec: float = 0.1,
         interact_on_input: bool = True,
 ) -> None:
     """
@@ -99,9 +257,18 @@ def process_video(
         validator: класс с логикой, отвечающей за валидацию собранных данных
         eventloop: асинхронный событийный цикл,
                    должен быть уже запущен и работать параллельно
+        capture_api: имя бэкенда видеозахвата OpenCV ('ANY', 'FFMPEG', 'GSTREAMER' и т.д.)
         capture_buffer_size: кол-во кадров, хранящихся в буффере видеопотоков
+        drop_old_frames: при отставании обработки выбрасывать старые кадры ради свежих
+                         (``None`` - только для живых видеопотоков, но не для видеофайлов)
         video_sizer: коэффициент уменьшения кадров с видео
+        max_codes_per_pack: максимальное кол-во кодов каждого типа, запоминаемых для одной пачки
+        detector_stride: обрабатывается (и показывается) только каждый detector_stride-ый кадр,
+                         остальные кадры даже не декодируются
+        max_same_frame_skips: сколько кадров подряд, не изменившихся с предыдущего,
+                              можно пропустить без чтения кодов
         show_video: отображать видео на экране
+        show_video_period_sec: минимальный интервал между обновлениями окна с видео
         threads_count: кол-во потоков, используемых для одновременной обработки видео
         interact_on_input: прекращать обработку при нажатии esc или q,
                            а также ставить на паузу при нажатии пробела
@@ -111,103 +278,133 @@ def process_video(
     if threads_count is None:
         threads_count = cv2.getNumberOfCPUs() // 2 + 1
 
-    assert_video_is_ok(video_path)
+    capture_api_id = get_capture_api(capture_api)
+    if drop_old_frames is None:
+        drop_old_frames = not os.path.isfile(video_path)
+    assert_video_is_ok(video_path, capture_api=capture_api_id)
     assert 0 < video_sizer <= 1.0, "Коэффициент размера изображения должен быть (0.0; 1.0]"
     assert 0 < threads_count, "Кол-во потоков должно быть целым положительным числом"
-
-    cap = cv2.VideoCapture(video_path)
+    assert 0 < max_codes_per_pack, "Кол-во кодов на пачке должно быть целым положительным числом"
+    assert 0 < detector_stride, "Шаг детектора должен быть целым положительным числом"
+    assert 0 <= max_same_frame_skips, "Кол-во пропусков кадров должно быть неотрицательным целым числом"
+
+    # внутренние потоки OpenCV (resize, cvtColor и т.п.) не должны конкурировать
+    # с потоками чтения кодов - им отдаются оставшиеся ядра
+    cv2.setNumThreads(max(1, cv2.getNumberOfCPUs() - threads_count))
+
+    reader = FrameReader(
+        video_path,
+        capture_api=capture_api_id,
+        capture_buffer_size=capture_buffer_size,
+        drop_old_frames=drop_old_frames,
+        # конвейер движется медленно - детектор и чтение кодов
+        # достаточно запускать лишь на каждом detector_stride-ом кадре
+        decode_stride=detector_stride,
+    )
+    reader.start()
     pool = Pool(processes=threads_count)
-    pending = deque()
+    # незавершённые задачи чтения кодов с кадров текущей пачки
+    pending_codes = deque()
 
     # клавиши для выхода
     stop_keys = [27, ord('q'), ord('Q'), ]
 
-    # уменьшение размера буффера
-    # (если обработка видео будет запаздывать,
-    # то большой буффер будет приводить к задержкам)
-    cap.set(cv2.CAP_PROP_BUFFERSIZE, capture_buffer_size)
-
     last_barcode = '0' * 13
 
     # noinspection PyUnusedLocal
     is_prev_pack_exists = False
     is_curr_pack_exists = False
 
-    empty_record = {
-        'QRCODE': [],
-        'EAN13': [],
-    }
-    record = copy.deepcopy(empty_record)
-
-    while True:
-        if len(pending) < threads_count:
-            exists, frame = cap.read()
-
-            if not exists:
-                logger.error("Видеопоток: кадр не был получен. Переподключение")
-                cap.open(video_path)
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, capture_buffer_size)
-                continue
-
-            pack_img = get_codes_image_region(frame)
-
-            task = FakeApplyResult(process_frame(pack_img, sizer=video_sizer))
-
-            # TODO: продумать синхронизацию данных при многопоточном подходе
-            # task = pool.apply_async(
-            #     process_frame,
-            #     args=(pack_img.copy(),),
-            #     kwds=dict(sizer=video_sizer),
-            # )
-
-            pending.append(task)
+    record = {'QRCODE': [], 'EAN13': []}
+    seen_codes = {'QRCODE': set(), 'EAN13': set()}
 
-        while len(pending) > 0 and pending[0].ready():
-            pack_img = pending.popleft().get()
+    show_limiter = RateLimiter(show_video_period_sec)
 
-            # определение наличия пачки
-            is_prev_pack_exists = is_curr_pack_exists
-            is_curr_pack_exists = detector.is_detected(pack_img)
+    # хэш предыдущего кадра пачки: с неизменившегося кадра повторно коды не читаются
+    prev_frame_hash = None
+    same_frame_skips = 0
 
-            if is_curr_pack_exists:
-                if not is_prev_pack_exists:
-                    record = copy.deepcopy(empty_record)
-
-                codes = get_codes_from_image(pack_img)
-                record['QRCODE'] = list(dict.fromkeys(record['QRCODE'] + codes['QRCODE']))
-                record['EAN13'] = list(dict.fromkeys(record['EAN13'] + codes['EAN13']))
-
-            elif is_prev_pack_exists:
-
-                if len(record['EAN13']) > 0:
-                    last_barcode = record['EAN13'][-1]
-
-                # генерация недостающих штрих-кодов
-                while len(record['EAN13']) < len(record['QRCODE']):
-                    record['EAN13'].append(last_barcode)
-                while len(record['EAN13']) > len(record['QRCODE']):
-                    record['EAN13'].pop()
-
-                record['expected'] = accessor.get_expected_codes_count()
-                validated = validator.get_validated(record)
-
-                if validated['is_valid']:
-                    notify = notifier.notify_about_good_pack
-                else:
-                    notify = notifier.notify_about_bad_pack
-                asyncio.run_coroutine_threadsafe(notify(validated), eventloop)
-
-                record = copy.deepcopy(empty_record)
-
-            if show_video:
-                cv2.imshow('conveyor', pack_img)
-
-                key = cv2.waitKey(1)
-                if interact_on_input:
-                    if key in stop_keys:
-                        # завершение обработки при нажатии esc или q
-                        raise KeyboardInterrupt()
-
-                    if key == ord(' '):
-                        # пауза
-                        cv2.waitKey(0)
+    while True:
+        # кадр ждётся на очереди FrameReader'а (без холостого опроса),
+        # а тяжёлое чтение кодов уходит в пул потоков
+        frame = reader.read()
+        # кадр уменьшается сразу, чтобы все дальнейшие шаги работали с меньшим изображением
+        pack_img = get_codes_image_region(process_frame(frame, sizer=video_sizer))
+
+        # определение наличия пачки
+        is_prev_pack_exists = is_curr_pack_exists
+        is_curr_pack_exists = detector.is_detected(pack_img)
+
+        if is_curr_pack_exists:
+            if not is_prev_pack_exists:
+                record = {'QRCODE': [], 'EAN13': []}
+                seen_codes = {'QRCODE': set(), 'EAN13': set()}
+
+            frame_hash = get_image_hash(pack_img)
+            # с неизменившегося кадра коды уже были прочитаны, но только если они нашлись:
+            # иначе (например, первый кадр был смазан) чтение повторяется,
+            # да и в любом случае повторяется после max_same_frame_skips пропусков
+            is_skipped_frame = (
+                is_prev_pack_exists
+                and frame_hash == prev_frame_hash
+                and same_frame_skips < max_same_frame_skips
+                and len(record['QRCODE']) + len(record['EAN13']) > 0
+            )
+            prev_frame_hash = frame_hash
+            same_frame_skips = same_frame_skips + 1 if is_skipped_frame else 0
+
+            if not is_skipped_frame:
+                if len(pending_codes) >= threads_count:
+                    # чтение кодов не поспевает за видео - дожидаемся самого старого
+                    codes = pending_codes.popleft().get()
+                    add_new_codes(record, codes, seen_codes, max_codes_per_pack=max_codes_per_pack)
+
+                # pyzbar вызывает zbar через ctypes с отпущенным GIL,
+                # поэтому коды с нескольких кадров читаются параллельно
+                pending_codes.append(pool.apply_async(get_codes_from_image, args=(pack_img,)))
+
+            while len(pending_codes) > 0 and pending_codes[0].ready():
+                codes = pending_codes.popleft().get()
+                add_new_codes(record, codes, seen_codes, max_codes_per_pack=max_codes_per_pack)
+
+        elif is_prev_pack_exists:
+
+            # пачка ушла - дочитываем коды со всех её кадров
+            while len(pending_codes) > 0:
+                codes = pending_codes.popleft().get()
+                add_new_codes(record, codes, seen_codes, max_codes_per_pack=max_codes_per_pack)
+
+            if len(record['EAN13']) > 0:
+                last_barcode = record['EAN13'][-1]
+
+            # генерация недостающих штрих-кодов
+            while len(record['EAN13']) < len(record['QRCODE']):
+                record['EAN13'].append(last_barcode)
+            while len(record['EAN13']) > len(record['QRCODE']):
+                record['EAN13'].pop()
+
+            record['expected'] = accessor.get_expected_codes_count()
+            validated = validator.get_validated(record)
+
+            if validated['is_valid']:
+                notify = notifier.notify_about_good_pack
+            else:
+                notify = notifier.notify_about_bad_pack
+            asyncio.run_coroutine_threadsafe(notify(validated), eventloop)
+
+            record = {'QRCODE': [], 'EAN13': []}
+            seen_codes = {'QRCODE': set(), 'EAN13': set()}
+
+        # отрисовка и опрос клавиатуры не чаще, чем раз в show_video_period_sec
+        if show_video and show_limiter.is_ready():
+            cv2.imshow('conveyor', pack_img)
+
+            key = cv2.waitKey(1)
+            if interact_on_input:
+                if key in stop_keys:
+                    # завершение обработки при нажатии esc или q
+                    raise KeyboardInterrupt()
+
+                if key == ord(' '):
+                    # пауза
+                    cv2.waitKey(0)
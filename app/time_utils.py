@@ -0,0 +1,38 @@
+"""
+Универсальные вспомогательные классы для работы со временем.
+Не зависят от конкретного проекта.
+"""
+import time
+
+__all__ = [
+    'RateLimiter',
+]
+
+
+class RateLimiter:
+    """
+    Разрешает выполнять действие не чаще, чем раз в заданный период.
+    Период отсчитывается по монотонным часам, а не по кол-ву вызовов,
+    поэтому не зависит от скорости обработки кадров.
+
+    Example:
+        >>> limiter = RateLimiter(0.5)
+        >>> if limiter.is_ready():
+        >>>     "выполняется не чаще раза в полсекунды"
+    """
+
+    def __init__(self, period_sec: float):
+        self._PERIOD_SEC = period_sec
+        self._last_time = time.monotonic() - period_sec
+
+    def is_ready(self) -> bool:
+        """
+        Возвращает ``True`` и начинает новый период,
+        если с прошлого срабатывания прошло больше периода.
+        Иначе возвращает ``False``.
+        """
+        now = time.monotonic()
+        if now - self._last_time > self._PERIOD_SEC:
+            self._last_time = now
+            return True
+        return False